@@ -1,5 +1,64 @@
-import itertools
 import random
+from functools import lru_cache, reduce
+from operator import or_
+
+import numpy as np
+
+# Shared empty result for sentences that do not decide any of their cells
+_NO_CELLS = frozenset()
+
+# Row and column offsets of the eight cells within one row and column of a cell
+_OFFSETS = tuple((di, dj) for di in (-1, 0, 1) for dj in (-1, 0, 1) if (di, dj) != (0, 0))
+
+
+@lru_cache(maxsize=None)
+def _neighbor_table(height, width):
+    """
+    Returns a tuple, indexed by i * width + j, holding the frozenset of cells
+    within one row and column of cell (i, j), not including the cell itself.
+    The table only depends on the board size, so it is built once per size and shared by every game.
+    """
+    # The 3x3 window is unrolled into its eight neighbors, each added only if it is on the board
+    table = []
+    for i in range(height):
+        up = i > 0
+        down = i < height - 1
+        for j in range(width):
+            left = j > 0
+            right = j < width - 1
+            neighbors = []
+            if up:
+                neighbors.append((i - 1, j))
+                if left:
+                    neighbors.append((i - 1, j - 1))
+                if right:
+                    neighbors.append((i - 1, j + 1))
+            if down:
+                neighbors.append((i + 1, j))
+                if left:
+                    neighbors.append((i + 1, j - 1))
+                if right:
+                    neighbors.append((i + 1, j + 1))
+            if left:
+                neighbors.append((i, j - 1))
+            if right:
+                neighbors.append((i, j + 1))
+            table.append(frozenset(neighbors))
+    return tuple(table)
+
+
+def _nearby_grid(board):
+    """
+    Returns an array holding, for every cell of `board`, the number of mines
+    within one row and column of it, not including the cell itself.
+    """
+    # Sum the zero-padded board shifted by each of the eight neighbor offsets
+    height, width = board.shape
+    padded = np.pad(board, 1)
+    return sum(
+        padded[1 + di:1 + di + height, 1 + dj:1 + dj + width]
+        for di, dj in _OFFSETS
+    )
 
 
 class Minesweeper():
@@ -12,27 +71,22 @@ class Minesweeper():
         # Set initial width, height, and number of mines
         self.height = height
         self.width = width
-        self.mines = set()
 
         # Initialize an empty field with no mines
-        self.board = []
-        for i in range(self.height):
-            row = []
-            for j in range(self.width):
-                row.append(False)
-            self.board.append(row)
+        self.board = np.zeros((height, width), dtype=np.uint8)
 
-        # Add mines randomly
-        while len(self.mines) != mines:
-            i = random.randrange(height)
-            j = random.randrange(width)
-            if not self.board[i][j]:
-                self.mines.add((i, j))
-                self.board[i][j] = True
+        # Add mines randomly, drawing distinct cell indices i * width + j in one call
+        indices = random.sample(range(height * width), mines)
+        self.mines = {divmod(k, width) for k in indices}
+        self.board.flat[indices] = 1
 
         # At first, player has found no mines
         self.mines_found = set()
 
+        # Count the nearby mines of every cell at once, kept as nested lists
+        # since reading a single Python int is cheaper than indexing a numpy array
+        self._nearby = _nearby_grid(self.board).tolist()
+
     def print(self):
         """
         Prints a text-based representation
@@ -49,8 +103,7 @@ class Minesweeper():
         print("--" * self.width + "-")
 
     def is_mine(self, cell):
-        i, j = cell
-        return self.board[i][j]
+        return cell in self.mines
 
     def nearby_mines(self, cell):
         """
@@ -58,24 +111,8 @@ class Minesweeper():
         within one row and column of a given cell,
         not including the cell itself.
         """
-
-        # Keep count of nearby mines
-        count = 0
-
-        # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
-
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
-
-        return count
+        i, j = cell
+        return self._nearby[i][j]
 
     def won(self):
         """
@@ -89,39 +126,72 @@ class Sentence():
     Logical statement about a Minesweeper game
     A sentence consists of a set of board cells,
     and a count of the number of those cells which are mines.
+    When the board width is given, the cells are also kept as an int bitmask (bit i * width + j for cell (i, j))
+    so that subset, difference, and equality tests are single integer operations.
     """
 
-    def __init__(self, cells, count):
+    def __init__(self, cells, count, width=None, mask=None):
         # Note there is no need to assert len(self.cells) > 0 in many methods
         # since self.cells is initialized as an empty set as part of the class invariant.
         self.cells = set(cells)
         self.count = count
+        self.width = width
+
+        # The mask can be passed in when the caller already has it (e.g. from bitmask arithmetic on other sentences).
+        # It needs the board width, so a sentence built without either has no mask and is compared by its cells.
+        if mask is None and width is not None:
+            mask = reduce(or_, (1 << (i * width + j) for i, j in self.cells), 0)
+        self.mask = mask
+
+        # known_mines and known_safes are computed on first use and cleared whenever the sentence changes
+        self._known_mines = None
+        self._known_safes = None
 
     def __eq__(self, other):
+        if not isinstance(other, Sentence):
+            return NotImplemented
+        if self.mask is not None and self.width == other.width:
+            # Masks built for the same board width are equal exactly when the cells are
+            return self.mask == other.mask and self.count == other.count
         return self.cells == other.cells and self.count == other.count
 
+    def __hash__(self):
+        # Computed on demand rather than cached: the AI checks duplicates with (mask, count) keys, not Sentence hashes,
+        # so keeping a cached hash current on every mark_mine and mark_safe would cost more than it saves.
+        # The cells are hashed rather than the mask, to agree with __eq__ for sentences built without a board width.
+        # The hash changes when a cell is marked, so a sentence should not be kept in a set or dict while it can still change.
+        return hash((frozenset(self.cells), self.count))
+
     def __str__(self):
         return f"{self.cells} = {self.count}"
 
     def known_mines(self):
         """
         Returns the set of all cells in self.cells known to be mines.
+        The result is a frozenset and is cached until the sentence changes.
         """
-        # Any time the number of cells is equal to the count,
-        # we know that all of that sentence’s cells must be mines.
-        if len(self.cells) == self.count:
-            return self.cells
-        return set()
+        if self._known_mines is None:
+            # Any time the number of cells is equal to the count,
+            # we know that all of that sentence’s cells must be mines.
+            if len(self.cells) == self.count:
+                self._known_mines = frozenset(self.cells)
+            else:
+                self._known_mines = _NO_CELLS
+        return self._known_mines
 
     def known_safes(self):
         """
         Returns the set of all cells in self.cells known to be safe.
+        The result is a frozenset and is cached until the sentence changes.
         """
-        # Any time we have a sentence whose count is 0,
-        # we know that all of that sentence’s cells must be safe.
-        if self.count is 0:
-            return self.cells
-        return set()
+        if self._known_safes is None:
+            # Any time we have a sentence whose count is 0,
+            # we know that all of that sentence’s cells must be safe.
+            if self.count == 0:
+                self._known_safes = frozenset(self.cells)
+            else:
+                self._known_safes = _NO_CELLS
+        return self._known_safes
 
     def mark_mine(self, cell):
         """
@@ -135,8 +205,12 @@ class Sentence():
         # then it must be the case that out of A and B, exactly one of them is a mine.
         if cell in self.cells:
             # If the mine is in the Sentence, remove it and decrement the count.
+            if self.mask is not None:
+                self.mask &= ~(1 << (cell[0] * self.width + cell[1]))
             self.cells.remove(cell)
             self.count = self.count - 1
+            self._known_mines = None
+            self._known_safes = None
 
     def mark_safe(self, cell):
         """
@@ -149,7 +223,11 @@ class Sentence():
         if cell in self.cells:
 
             # If the cell is safe, we can simply remove it from the sentence per the above example.
+            if self.mask is not None:
+                self.mask &= ~(1 << (cell[0] * self.width + cell[1]))
             self.cells.remove(cell)
+            self._known_mines = None
+            self._known_safes = None
 
 
 class MinesweeperAI():
@@ -166,30 +244,84 @@ class MinesweeperAI():
         # Keep track of which cells have been clicked on
         self.moves_made = set()
 
+        # Keep track of cells that have not been clicked on and are not known to be mines
+        self.moves_remaining = {(i, j) for i in range(height) for j in range(width)}
+
         # Keep track of cells known to be safe or mines
         self.mines = set()
         self.safes = set()
 
-        # List of sentences about the game known to be true
+        # Keep track of cells known to be safe that have not been clicked on yet,
+        # as a list for random.choice, with the position of each cell in it for constant time removal
+        self._available_safes = []
+        self._available_safe_positions = {}
+
+        # List of sentences about the game known to be true,
+        # with a set of their (mask, count) keys for constant time duplicate checks
         self.knowledge = []
+        self._knowledge_index = set()
+
+        # Position of each sentence (keyed by id()) in self.knowledge, so a sentence can be dropped without scanning the list
+        self._knowledge_positions = {}
+
+        # Index from each cell to the sentences (keyed by id()) that currently contain it
+        self._cell_to_sentences = {}
+
+        # Neighbors of every cell, computed once per board size
+        self._neighbors = _neighbor_table(height, width)
+
+        # Sentences that are new or have changed and still need to be checked for inferences, keyed by id().
+        # A sentence that changes again while it is waiting keeps its single entry, and is checked as it is by then.
+        self._dirty = {}
 
     def mark_mine(self, cell):
         """
         Marks a cell as a mine, and updates all knowledge
         to mark that cell as a mine as well.
         """
+        if cell in self.mines:
+            # Every sentence was already updated when this cell was first marked.
+            return
         self.mines.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_mine(cell)
+        self.moves_remaining.discard(cell)
+        self.__update_knowledge(cell, Sentence.mark_mine)
 
     def mark_safe(self, cell):
         """
         Marks a cell as safe, and updates all knowledge
         to mark that cell as safe as well.
         """
+        if cell in self.safes:
+            # Every sentence was already updated when this cell was first marked.
+            return
         self.safes.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_safe(cell)
+        if cell not in self.moves_made:
+            self._available_safe_positions[cell] = len(self._available_safes)
+            self._available_safes.append(cell)
+        self.__update_knowledge(cell, Sentence.mark_safe)
+
+    def __update_knowledge(self, cell, mark):
+        """
+        Private method to apply `mark` (Sentence.mark_mine or Sentence.mark_safe) for `cell` to every sentence containing it.
+        Each changed sentence is queued in self._dirty, unless it is now empty or duplicates another sentence,
+        in which case it is dropped from the knowledge base.
+        """
+        # Once marked, no sentence contains the cell any more, so its index entry can go.
+        sentences = self._cell_to_sentences.pop(cell, None)
+        if not sentences:
+            return
+        knowledge_index = self._knowledge_index
+        dirty = self._dirty
+        for sentence in sentences.values():
+            # Marking changes the sentence's key, so it has to leave self._knowledge_index first.
+            knowledge_index.remove((sentence.mask, sentence.count))
+            mark(sentence, cell)
+            key = (sentence.mask, sentence.count)
+            if not sentence.mask or key in knowledge_index:
+                self.__remove_sentence(sentence)
+            else:
+                knowledge_index.add(key)
+                dirty[id(sentence)] = sentence
 
     def add_knowledge(self, cell, count):
         """
@@ -207,71 +339,169 @@ class MinesweeperAI():
                if they can be inferred from existing knowledge
         """
         # 1) Mark the cell as a move that has been made:
-        self.moves_made.add(cell)
+        self.__store_move(cell)
 
         # 2) Mark the cell as safe:
         self.mark_safe(cell)
 
         # 3) Add a new sentence to the AI's knowledge base based on the value of `cell` and `count`
-        self.knowledge.append(Sentence(self.__get_neighbors(cell), count))
-        
-        # 4 & 5: within do-while loop (will always execute at least once)
-        while True: 
-            original_knowledge = self.knowledge.copy()
-            self.__infer_new_knowledge()
-            if len(original_knowledge) is len(self.knowledge):
-                # Then no new knowledge has been inferred
-                break
+        # Existing sentences already have every known safe and mine marked, so only the new sentence needs them applied:
+        # known cells are left out of it, and each known mine among the neighbors is taken off the count.
+        neighbors = self.__get_neighbors(cell)
+        cells = neighbors.difference(self.safes, self.mines)
+        if cells:
+            count -= len(neighbors & self.mines)
+            if count == 0:
+                # Every unknown neighbor is safe, so mark them directly rather than storing a sentence that would be dropped at once.
+                for safe in cells:
+                    self.mark_safe(safe)
+            elif count == len(cells):
+                # Likewise every unknown neighbor is a mine.
+                for mine in cells:
+                    self.mark_mine(mine)
+            else:
+                self.__add_sentence(Sentence(cells, count, self.width))
+
+        # 4 & 5: work through the queue of new or changed sentences until nothing more can be inferred
+        self.__infer_new_knowledge()
+
+    def __add_sentence(self, sentence):
+        """
+        Private method to add `sentence` to the knowledge base, and queue it to be checked for inferences,
+        unless the same sentence is already known.
+        """
+        key = (sentence.mask, sentence.count)
+        if key in self._knowledge_index:
+            return
+        self._knowledge_positions[id(sentence)] = len(self.knowledge)
+        self.knowledge.append(sentence)
+        self._knowledge_index.add(key)
+        self._dirty[id(sentence)] = sentence
+        for cell in sentence.cells:
+            self._cell_to_sentences.setdefault(cell, {})[id(sentence)] = sentence
+
+    def __remove_sentence(self, sentence):
+        """
+        Private method to drop `sentence` (already taken out of self._knowledge_index) from the knowledge base.
+        The last sentence in self.knowledge is moved into its place, so no other sentence has to move.
+        """
+        position = self._knowledge_positions.pop(id(sentence))
+        last = self.knowledge.pop()
+        if last is not sentence:
+            self.knowledge[position] = last
+            self._knowledge_positions[id(last)] = position
+        self._dirty.pop(id(sentence), None)
+        for cell in sentence.cells:
+            del self._cell_to_sentences[cell][id(sentence)]
+
+    def __store_move(self, cell):
+        """
+        Private method to record that `cell` has been clicked on,
+        keeping self.moves_remaining and self._available_safes in step with self.moves_made.
+        """
+        self.moves_made.add(cell)
+        self.moves_remaining.discard(cell)
+        position = self._available_safe_positions.pop(cell, None)
+        if position is not None:
+            # Move the last available safe into the clicked cell's slot, so no other cell has to move.
+            last = self._available_safes.pop()
+            if last != cell:
+                self._available_safes[position] = last
+                self._available_safe_positions[last] = position
 
     def __infer_new_knowledge(self):
         """
         Private method to infer new knowledge using the existing knowledge set.
         Return value is void, but this method will update sentences within self.knowledge or add any inferred sentences.
+        Only sentences queued in self._dirty (new or changed since they were last examined) are checked,
+        each against the sentences it shares a cell with, rather than re-checking every pair until nothing changes.
         """
-        # 4) Mark any additional cells as safe or as mines if it can be concluded based on the AI's knowledge base
-        for safe in self.safes:
-            self.mark_safe(safe)    # This will update all sentences for any known safes.
-        for mine in self.mines:
-            self.mark_mine(mine)    # This will update all sentences for any known mines.
-        for sentence in self.knowledge:
-            self.safes = self.safes.union(sentence.known_safes())   # This will add any newly discovered safes.
-            self.mines = self.mines.union(sentence.known_mines())   # This will add any newly discovered mines.
-
-        # 5: Any time we have two sentences set1 = count1 and set2 = count2 where set1 is a subset of set2, then we can construct the new sentence set2 - set1 = count2 - count1.
-        # Note: need to use a new list here else the current list of sentences could grow while iterating through it (it happened :))
-        inferred_knowledge = []
-        for sentence1 in self.knowledge:
-            set1 = sentence1.cells
-            for sentence2 in self.knowledge:
-                set2 = sentence2.cells
-                if set1 is not set2 and set1.issubset(set2): 
-                    inferred_sentence = Sentence(set2 - set1, sentence2.count - sentence1.count)
-                    if inferred_sentence not in inferred_knowledge:
-                        # Avoid adding duplicate sentences as this will just slow things down.
-                        inferred_knowledge.append(inferred_sentence)
-        for sentence in inferred_knowledge:
-            # Only add an inferred sentence if it is new knowledge.
-            if sentence not in self.knowledge:
-                self.knowledge.append(sentence)
-        
+        # Local names for the containers used in the loop; marking updates them in place, so they stay current.
+        dirty = self._dirty
+        cell_to_sentences = self._cell_to_sentences
+        knowledge_index = self._knowledge_index
+        width = self.width
+        while dirty:
+            # The order sentences are checked in does not change the result, so take the most recently queued (an O(1) pop).
+            _, sentence = dirty.popitem()
+
+            # 4) Mark any additional cells as safe or as mines if it can be concluded from this sentence.
+            # Marking a newly discovered cell queues every sentence it changes; marking a known cell does nothing.
+            # known_safes and known_mines return frozen copies, so they are safe to iterate while the sentence is marked.
+            known_safes = sentence.known_safes()
+            known_mines = sentence.known_mines()
+            if known_safes or known_mines:
+                for safe in known_safes:
+                    self.mark_safe(safe)
+                for mine in known_mines:
+                    self.mark_mine(mine)
+                # Every cell of this sentence is now marked, so it has been dropped as empty.
+                continue
+
+            # 5: Any time we have two sentences set1 = count1 and set2 = count2 where set1 is a subset of set2, then we can construct the new sentence set2 - set1 = count2 - count1.
+            # The subset test is done on the cell bitmasks: mask1 is a strict subset of mask2 when mask1 & mask2 == mask1 and mask1 != mask2.
+            # Sentences in the knowledge base are never empty, since empty sentences are dropped as soon as they are produced.
+            mask = sentence.mask
+
+            # Nothing is added or marked until the scan is done, so the sentences being compared do not change while it runs.
+            # An inferred sentence that already decides its cells (count of 0, or count equal to its size) is not stored;
+            # its cells are collected here and marked once after the scan.
+            inferred_knowledge = []
+            new_safes = set()
+            new_mines = set()
+
+            # Only sentences sharing at least one cell with this one can be a subset, a superset, or overlap it.
+            candidates = {}
+            for cell in sentence.cells:
+                candidates.update(cell_to_sentences[cell])
+            for other in candidates.values():
+                other_mask = other.mask
+                if other_mask == mask or id(other) in dirty:
+                    # A sentence still waiting in self._dirty will check this pair itself when its turn comes.
+                    continue
+                common = mask & other_mask
+                if common == mask:
+                    superset, subset, cells_mask = other, sentence, other_mask & ~mask
+                elif common == other_mask:
+                    superset, subset, cells_mask = sentence, other, mask & ~other_mask
+                else:
+                    # Overlapping sentences: subtracting one from the other (as in Gaussian elimination) gives
+                    # mines(set1 - set2) - mines(set2 - set1) = count1 - count2. When that difference equals the size
+                    # of one side, every cell on that side is a mine and every cell on the other side is safe.
+                    # (bin().count is used for the popcount, as int.bit_count needs Python 3.10.)
+                    difference = sentence.count - other.count
+                    common_size = bin(common).count("1")
+                    if difference == len(sentence.cells) - common_size:
+                        new_mines |= sentence.cells - other.cells
+                        new_safes |= other.cells - sentence.cells
+                    elif -difference == len(other.cells) - common_size:
+                        new_mines |= other.cells - sentence.cells
+                        new_safes |= sentence.cells - other.cells
+                    continue
+                count = superset.count - subset.count
+                if count == 0:
+                    new_safes |= superset.cells - subset.cells
+                elif count == len(superset.cells) - len(subset.cells):
+                    new_mines |= superset.cells - subset.cells
+                elif (cells_mask, count) not in knowledge_index:
+                    # The sentence is only built when it is not already known.
+                    inferred_knowledge.append(Sentence(superset.cells - subset.cells, count, width, cells_mask))
+            for inferred_sentence in inferred_knowledge:
+                # Only add an inferred sentence if it is new knowledge.
+                self.__add_sentence(inferred_sentence)
+            for safe in new_safes:
+                self.mark_safe(safe)
+            for mine in new_mines:
+                self.mark_mine(mine)
+
     def __get_neighbors(self, cell):
         """
         Private method to retrieve all neighboring cells of a given cell.
-        Returns a set of (i, j) 2-tuples representing the neighboring cells.
+        Returns a frozenset of (i, j) 2-tuples representing the neighboring cells.
+        The neighbors of every cell are precomputed once per board size, so this is a single table lookup.
+        Cells in self.moves_made are included; they are known safes and are filtered out by add_knowledge.
         """
-        neighbors = set()
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
-
-                # Add neighbor if cell in bounds and is not in self.moves_made
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if (i, j) not in self.moves_made:
-                        neighbors.add((i, j))
-        return neighbors
+        return self._neighbors[cell[0] * self.width + cell[1]]
 
     def make_safe_move(self):
         """
@@ -286,15 +516,12 @@ class MinesweeperAI():
         if(self.__has_no_moves_remaining()):
             return None
 
-        # Get the set of known safe moves
-        safe_moves = self.safes - self.moves_made
-
-        # Return None if there are no safe moves:
-        if len(safe_moves) is 0:
+        # Return None if there are no safe moves (self._available_safes is kept up to date by mark_safe and add_knowledge):
+        if not self._available_safes:
             return None
 
         # Else return a random safe move:
-        return random.sample(safe_moves, 1)[0]
+        return random.choice(self._available_safes)
 
     def make_random_move(self):
         """
@@ -306,20 +533,8 @@ class MinesweeperAI():
         if(self.__has_no_moves_remaining()):
             return None
 
-        # Determine the remaining non-mine cell moves remaining:
-        moves_remaining = set()
-        for i in range(self.height):
-            for j in range(self.width):
-                if (i, j) in self.mines:
-                    continue
-                # No need to include moves which have already been made
-                elif (i, j) in self.moves_made:
-                    continue
-                else:
-                    moves_remaining.add((i, j))
-
-        # Return a random element from the remaining moves:
-        return random.sample(moves_remaining, 1)[0]
+        # Return a random element from the remaining moves (kept up to date by add_knowledge and mark_mine):
+        return random.choice(tuple(self.moves_remaining))
         
     def __has_no_moves_remaining(self):
         """
@@ -327,4 +542,4 @@ class MinesweeperAI():
         Return true if there are no moves remaining (when every non-mine cell move has been made)
         Returns false if there are moves remaining.
         """
-        return len(self.moves_made) + len(self.mines) is self.height * self.width
+        return not self.moves_remaining